@@ -2,8 +2,7 @@
 
 import sys
 import os
-import datetime
-import inspect
+import time
 
 
 #
@@ -14,6 +13,64 @@ import inspect
 #   ~/.dbg ?
 #
 
+#
+# datetime module; only needed for a non-default hdr_date_format, so
+# imported on first use
+#
+_datetime = None
+def _dt():
+  global _datetime
+  if _datetime is None:
+    import datetime as _datetime
+  return _datetime
+
+
+#
+# stand-in for Dbg level methods disabled at the debug level; kept in the
+# instance dict, so takes no self, and holds no reference to the instance
+#
+def _lvl_off(txt):
+  pass
+
+
+#
+# indexes of deferred msgs passing the Dbg.msgs() filters; each active
+# filter narrows the index list in a single comprehension, inactive
+# filters cost nothing
+#
+def _filter_msgs(dlvls, fnms, funcs, lns, dlvl, fnm, func, ln_beg, ln_end):
+  idx = range(len(dlvls))
+  if dlvl is not None: idx = [i for i in idx if dlvls[i] <= dlvl]
+  if fnm is not None: idx = [i for i in idx if fnms[i] == fnm]
+  if func is not None: idx = [i for i in idx if funcs[i] == func]
+  if ln_beg is not None: idx = [i for i in idx if lns[i] >= ln_beg]
+  if ln_end is not None: idx = [i for i in idx if lns[i] < ln_end]
+  return idx
+
+
+#
+# Dbg attribute whose assignment rebuilds the state cached from it, by
+# calling the named Dbg method; reads on the class give the default
+#
+class _Setting:
+
+  def __init__(self, dflt, rebuild):
+    self.dflt = dflt
+    self.rebuild = rebuild
+
+  def __set_name__(self, owner, name):
+    self.name = name
+
+  def __get__(self, obj, owner=None):
+    if obj is None:
+      return self.dflt
+    return obj.__dict__.get(self.name, self.dflt)
+
+  def __set__(self, obj, val):
+    obj.__dict__[self.name] = val
+    getattr(obj, self.rebuild)()
+
+
 #
 # Utility to write debug lines to stdout and, optionally, to a log file
 # 
@@ -42,8 +99,10 @@ class Dbg:
                 'wrn', 'inf', 'dbg', and 'dbg2'.  All coded debug lines
                 configured with the specified 'lvl', or lower will be
                 output at runtime - default level: 'err'.
-    trc         Enables printing of enter/leave lines and appropriate 
-                indentation of all output lines
+    trc         Enables printing of enter/leave lines, and indents output
+                lines by enter()/leave() nesting; the nesting count is per
+                Dbg object, not per thread, and lines outside any enter()
+                aren't indented
     log_file    If specified causes any output to be appended to the named 
                 log file - default: None.
     log_only    Bypass stdout and only write debug output to the specified 
@@ -74,52 +133,91 @@ class Dbg:
     "db2":5, "idb":6, "log":7
   }
 
+  # level int -> name; first name wins for shared values ('none' over 'any')
+  _lvl_name = {v:k for k,v in reversed(levels.items())}
+
+  # d.<lvl>() method names and their levels; see _recompute_enabled()
+  _lvl_meths = (("any",-1), ("out",0), ("err",1), ("wrn",2), ("inf",3),
+                ("dbg",4), ("db2",5), ("log",7))
+
+  # level names in level order; for arg_parser() help
+  _lvl_help = "[" + ", ".join(sorted(levels, key=levels.get)) + "]"
+
   lvl_dflt = "err"
   dlvl_dflt = ERR
   trc_dflt = False
 
   script = None             # calling script name
-  dmsgs = []                # debug message list
-  dlvl = ERR                # debug level (int)
+  # debug message list; one parallel list per field, indexed by msg
+  _dmsg_lvl = []            # level name
+  _dmsg_fnm = []            # file name
+  _dmsg_func = []           # func name
+  _dmsg_ln = []             # line number
+  _dmsg_txt = []            # msg text
+  _dmsg_dlvl = []           # level (int)
+  _dmsg_dpth = []           # enter() nesting
+  # _Setting attrs may be assigned directly, or via their setX() methods
+  dlvl = _Setting(ERR, '_recompute_enabled') # debug level (int)
   trc = False               # print call stack enter/leave strings
-  log_fp = None             # log file handle; if logging enabled
+  _depth = 0                # enter() nesting; indents trc output
+  _INDENTS = tuple("  " * i for i in range(128)) # trc indent by _depth
+  log_fp = _Setting(None, '_set_log_on') # log file handle; if not log_file
+  _log_fd = None            # log file descriptor; if opened from log_file
+  _log_on = False           # log_fp or _log_fd is open
+  log_buf_lines = 64        # log lines buffered before writing the log
   log_file = None           # log file name
   log_only = False          # don't write stdout
   force_out = True          # force 'out' level even if log_only
-  date_n_time = True        # add date and timestamp header to each line
-  file_n_line = True        # add file and lineno header to each line
-  hdr_date_format = "%Y-%m-%d %H:%M:%S.%f" # includes milli seconds
+  date_n_time = _Setting(True, '_set_fmt_line') # add date and timestamp hdr
+  file_n_line = _Setting(True, '_set_fmt_line') # add file and lineno hdr
+  hdr_date_format = _Setting("%Y-%m-%d %H:%M:%S.%f", # includes micro seconds
+                             '_set_ts_fmt')
+  _ts_fast = True           # hdr_date_format is "%Y-%m-%d %H:%M:%S[.%f]"
+  _ts_usec = True           # hdr_date_format ends in ".%f"
+  _ts_cache = (0, "")       # (epoch second, formatted second) last used
   file_func_line = False    # file, func, and line formating on msgs()
-  fnm = None                # file name filter; only named file msgs printed
-  func = None               # func name filter; only named func msgs printed
-  ln_beg = None             # line filter; only lines within beg:end printed
-  ln_end = None             # can limit to a single dbg msgs line
-
-  # add msg to dmsgs list; saves lvl, fnm, func, ln, and txt
+  fnm = _Setting(None, '_set_filter')    # file name filter
+  func = _Setting(None, '_set_filter')   # func name filter; comma delimited
+  ln_beg = _Setting(None, '_set_filter') # line filter; only beg:end printed
+  ln_end = _Setting(None, '_set_filter') # can limit to a single line
+  _fnm_cache = {}           # co_filename -> source file basename
+
+  # source file basename for a code object; cached per source file;
+  # interned so fnm filter compares are mostly identity checks
+  @classmethod
+  def _resolve_fnm(cls, code):
+    path = code.co_filename
+    fnm = cls._fnm_cache.get(path)
+    if fnm is None:
+      fnm = sys.intern(os.path.basename(os.path.realpath(path)))
+      cls._fnm_cache[path] = fnm
+    return fnm
+
+  # add msg to msgs list; saves lvl, fnm, func, ln, and txt
   def msg(self,dlvl,txt):
-    # get file name, func name, and line number
-    if dlvl < self.ANY or dlvl > self.LOG:
+    lvl = self._lvl_name.get(dlvl)
+    if lvl is None:
       raise ValueError("Debug level of '{}' not recognized.".format(dlvl))
-    lvl = list(self.levels.keys())[list(self.levels.values()).index(dlvl)]
-    try:
-      fnm = inspect.currentframe().f_back.f_globals['__file__']
-    except:
-      fnm = "<nofile>"
-    fnm = os.path.realpath(fnm)
-    fnm = os.path.basename(fnm)
-    func = inspect.currentframe().f_back.f_code.co_name
-    ln = inspect.currentframe().f_back.f_lineno
-    dpth = self.__frame_depth(less=1)
+    # get file name, func name, and line number
+    frame = sys._getframe(1)
+    code = frame.f_code
+    fnm = self._resolve_fnm(code)
+    func = sys.intern(code.co_name)
+    ln = frame.f_lineno
     # allows for filtering of msg output by lvl, fnm, func, and ln range
-    mobj = {'lvl':lvl,'fnm':fnm,'func':func,'ln':ln,
-            'txt':txt,'dlvl':dlvl,'dpth':dpth}
-    self.dmsgs.append(mobj)
+    self._dmsg_lvl.append(lvl)
+    self._dmsg_fnm.append(fnm)
+    self._dmsg_func.append(func)
+    self._dmsg_ln.append(ln)
+    self._dmsg_txt.append(txt)
+    self._dmsg_dlvl.append(dlvl)
+    self._dmsg_dpth.append(self._depth)
 
 
 
   def msgsx(self,msg=None):
     if msg: self.msg (self.ERR, msg)
-    self.msgs(); sys.exit(1)
+    self.msgs(); self.flush(); sys.exit(1)
 
 
 
@@ -129,33 +227,32 @@ class Dbg:
     if ffl is None: ffl = self.file_func_line
     if banner:
       self.__print (self.OUT,banner)
-    for msg in self.dmsgs:
-      if dlvl is not None and msg['dlvl'] > dlvl: continue
-      if fnm is not None and msg['fnm'] != fnm: continue
-      if func is not None and msg['func'] != func: continue
-      if ln_beg is not None and msg['ln'] < ln_beg: continue
-      if ln_end is not None and msg['ln'] >= ln_end: continue
-      txt = msg['txt']
+    m_dlvl = self._dmsg_dlvl; m_fnm = self._dmsg_fnm
+    m_func = self._dmsg_func; m_ln = self._dmsg_ln
+    for i in _filter_msgs (m_dlvl, m_fnm, m_func, m_ln,
+                           dlvl, fnm, func, ln_beg, ln_end):
+      txt = self._dmsg_txt[i]
       if ffl:
-        txt = msg['fnm']+':'+msg['func']+'():'+str(msg['ln'])+\
-              '('+str(msg['dpth'])+') '+msg['lvl']+" "+msg['txt']
-      pdlvl = msg['dlvl']
+        txt = f"{m_fnm[i]}:{m_func[i]}():{m_ln[i]}"\
+              f"({self._dmsg_dpth[i]}) {self._dmsg_lvl[i]} {txt}"
+      pdlvl = m_dlvl[i]
       if dlvl is not None: pdlvl = dlvl
-      self.__print (pdlvl,txt,dpth=msg['dpth'])
+      self.__print (pdlvl,txt,dpth=self._dmsg_dpth[i])
     if clr:
-      self.dmsgs.clear()
+      self.clr()
 
 
 
-  # True if msgs in dmsgs list
+  # True if msgs in msgs list
   def errs (self):
-    if len(self.dmsgs) > 0: return True
-    else: return False
+    return bool(self._dmsg_dlvl)
 
 
 
   def clr (self):
-    self.dmsgs.clear()
+    for lst in (self._dmsg_lvl, self._dmsg_fnm, self._dmsg_func, self._dmsg_ln,
+                self._dmsg_txt, self._dmsg_dlvl, self._dmsg_dpth):
+      lst.clear()
 
 
 
@@ -166,9 +263,10 @@ class Dbg:
     while True:
       try:
         frm = sys._getframe(dpth)
-        fnm,ln,func,coc,inx = inspect.getframeinfo(frm)
-        fnm = os.path.realpath(fnm)
-        fnm = os.path.basename(fnm)
+        code = frm.f_code
+        fnm = self._resolve_fnm(code)
+        func = code.co_name
+        ln = frm.f_lineno
         sfrm = "{}, {}(), ln:{}".format(fnm,func,ln)
         stk.append(sfrm)
         dpth += 1
@@ -180,102 +278,183 @@ class Dbg:
 
 
 
-  # determine indentation for sub-functions
-  def __frame_depth(self,less=None):
-    dpth = 2  # current frame and caller's frame always exist
-    if less is not None: dpth += less # add'l caller frames
-    while True:
-      try:
-        sys._getframe(dpth)
-        dpth += 1
-      except ValueError:
-        return dpth - 1  # subtract current frame
+  # date and time for line headers; default formats strftime once a second
+  def __timestamp(self):
+    if not self._ts_fast:
+      return _dt().datetime.now().strftime(self.hdr_date_format)
+    now = time.time()
+    sec = int(now)
+    cached_sec, cached_str = self._ts_cache
+    if sec != cached_sec:
+      cached_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(sec))
+      self._ts_cache = (sec, cached_str)
+    if self._ts_usec:
+      return "%s.%06d" %(cached_str, int((now - sec) * 1e6))
+    return cached_str
+
+
+  # build the line formatter for the date_n_time and file_n_line headers;
+  # rebuilt by the setters, so per-line calls don't branch on them; called
+  # with self, as it's kept on self
+  def _build_fmt_line(self):
+    timestamp = Dbg.__timestamp
+    lvl_name = self._lvl_name
+    resolve_fnm = self._resolve_fnm
+
+    # file name, func, and line number of frame
+    def fnl(frame):
+      code = frame.f_code
+      func = code.co_name
+      func = "__main__:" if func == "<module>" else func+"():"
+      return f"{resolve_fnm(code)}:{func}{frame.f_lineno}"
+
+    # format a line for output; frame is the caller's
+    if self.date_n_time and self.file_n_line:
+      def fmt_line(d, dlvl, txt, frame):
+        return f"[{timestamp(d)} {lvl_name[dlvl]} {fnl(frame)}] {txt}\n"
+    elif self.date_n_time:
+      def fmt_line(d, dlvl, txt, frame):
+        return f"[{timestamp(d)} {lvl_name[dlvl]}] {txt}\n"
+    elif self.file_n_line:
+      def fmt_line(d, dlvl, txt, frame):
+        return f"[{fnl(frame)}] {txt}\n"
+    else:
+      def fmt_line(d, dlvl, txt, frame):
+        return f"{txt}\n"
 
+    return fmt_line
 
-  # format a line for output; optionally add a header
-  def __format_line(self, dlvl, txt):
 
-      hdr = ""
+  # filter lines by filenm, func, ln_beg, ln_end; frame is the caller's
+  def __filter (self, frame):
 
-      # add date and timestamp to line header
-      if self.date_n_time:
-        hdr += "%s %s" %(
-          datetime.datetime.now().strftime(self.hdr_date_format),
-          list(self.levels.keys())[list(self.levels.values()).index(dlvl)])
+      if not self._has_filter:
+        return False
+      code = frame.f_code
+      return self._filter_fn (self._resolve_fnm(code),
+                              sys.intern(code.co_name), frame.f_lineno)
 
-      # get file name, func name, and line number
-      try:
-        fnm = inspect.currentframe().f_back.f_back.f_back.f_globals['__file__']
-      except:
-        fnm = "<nofile>"
-      fnm = os.path.realpath(fnm)
-      fnm = os.path.basename(fnm)
-      func = inspect.currentframe().f_back.f_back.f_back.f_code.co_name
-      ln = inspect.currentframe().f_back.f_back.f_back.f_lineno
-
-      # add filename, [func] and line number to line header
-      if self.file_n_line:
-        func = "__main__:" if func == "<module>" else func+"():"
-        if self.date_n_time:
-          hdr += " "
-        hdr += "%s:%s%s" %(fnm, func, ln)
-
-      # format header
-      if self.file_n_line or self.date_n_time:
-        hdr = "[%s] " %hdr
-
-      return "%s%s\n" %(hdr, txt)
-
-
-  # filter lines by filenm, func, ln_beg, ln_end
-  def __filter (self, dpth):
-
-      hdr = ""
-
-      # get file name, func and line number; at depth
-      frame = inspect.currentframe().f_back
-      while dpth > 0:
-        try:
-          fnm = frame.f_globals['__file__']
-        except:
-          fnm = "<nofile>"
-        fnm = os.path.realpath(fnm)
-        fnm = os.path.basename(fnm)
-        func = frame.f_code.co_name
-        ln = frame.f_lineno
-        frame = frame.f_back
-        dpth -= 1
 
-      if self.fnm is not None and fnm != self.fnm: return True
-      if self.func is not None:
-        for fnc in self.func.split(','):
-          if func == fnc: return False
-        return True
-      if self.ln_beg is not None and int(ln) < int(self.ln_beg): return True
-      if self.ln_end is not None and int(ln) > int(self.ln_end): return True
+  # set _filter_fn for __filter(); _has_filter skips it when no filter is set
+  def _set_filter(self):
+    self._has_filter = (self.fnm is not None or self.func is not None or
+                        self.ln_beg is not None or self.ln_end is not None)
+    self._filter_fn = self._build_filter()
+
+
+  # set _fmt_line; see _build_fmt_line()
+  def _set_fmt_line(self):
+    self._fmt_line = self._build_fmt_line()
+
+
+  # set the __timestamp() fast path flags for hdr_date_format
+  def _set_ts_fmt(self):
+    self._ts_usec = self.hdr_date_format == "%Y-%m-%d %H:%M:%S.%f"
+    self._ts_fast = (self._ts_usec or
+                     self.hdr_date_format == "%Y-%m-%d %H:%M:%S")
+
 
+  # set _log_on; a log_fp or _log_fd is open
+  def _set_log_on(self):
+    self._log_on = self._log_fd is not None or bool(self.log_fp)
+
+
+  # compile fnm, func, and ln_beg:ln_end filters into one predicate;
+  # rebuilt by the setters, so per-line calls only compare
+  def _build_filter(self):
+    fnm_flt = sys.intern(self.fnm) if self.fnm is not None else None
+    funcs = None
+    if self.func is not None:
+      funcs = frozenset(sys.intern(fnc) for fnc in self.func.split(','))
+    ln_beg = int(self.ln_beg) if self.ln_beg is not None else None
+    ln_end = int(self.ln_end) if self.ln_end is not None else None
+
+    # True if the line at fnm, func, ln is filtered out
+    def filtered(fnm, func, ln):
+      if fnm_flt is not None and fnm != fnm_flt: return True
+      if funcs is not None: return func not in funcs
+      if ln_beg is not None and ln < ln_beg: return True
+      if ln_end is not None and ln > ln_end: return True
       return False
 
+    return filtered
+
+
+  # write a log line; lines for the _log_fd we opened are buffered, and
+  # written at log_buf_lines, or at once at 'err' or below; a caller's
+  # log_fp does its own buffering, so gets each line as is
+  def __log_write(self, dlvl, line):
+    if self._log_fd is None:
+      self.log_fp.write (line)
+      return
+    self._log_buf.append(line)
+    if dlvl <= self.ERR or len(self._log_buf) >= self.log_buf_lines:
+      self.__flush_log()
+
+
+  # write buffered log lines to _log_fd; os.write() needs no flush
+  def __flush_log(self):
+    if self._log_buf:
+      buf = memoryview("".join(self._log_buf).encode('utf-8'))
+      self._log_buf.clear()
+      while buf:
+        buf = buf[os.write (self._log_fd, buf):]
+
+
+  # write out buffered log lines, and flush log_fp; e.g. before exiting
+  def flush(self):
+    self.__flush_log()
+    if self._log_fd is None and self.log_fp:
+      self.log_fp.flush()
+
+
+  # open log_file for appending; written with os.write() by __flush_log()
+  def __open_log(self, log_file):
+    self.__close_log(close_fp=False)
+    self.log_fp = None
+    self.log_file = log_file
+    self._log_fd = os.open (log_file, os.O_WRONLY|os.O_APPEND|os.O_CREAT,
+                            0o644)
+    self._set_log_on()
+
+
+  # write out buffered log lines and close the _log_fd we opened; log_fp may
+  # be the caller's, e.g. sys.stdout, so it's left open unless close_fp
+  def __close_log(self, close_fp=True):
+    if not self._log_on:
+      return
+    if self._log_fd is not None:
+      self.__flush_log()
+      os.close (self._log_fd)
+      self._log_fd = None
+    elif close_fp:
+      self.log_fp.close()
+    else:
+      return
+    self._log_on = False
+
 
   # show func enter and leave msgs at 'dbg' level
   def enter(self, msg=""): self.__enter(msg)
 
   # get deeper in stack so __format() works correctly for all
   def __enter(self, msg=""):
+    dpth = self._depth
+    self._depth += 1
     if not self.trc:
       return
-    if self.__filter (3):
+    frame = sys._getframe(2)  # skip __enter and enter
+    if self.__filter (frame):
       return
-    dpth = self.__frame_depth()
-    func = inspect.currentframe().f_back.f_back.f_code.co_name
-    ws = "  " * (dpth - 4)
+    func = frame.f_code.co_name
+    ws = self._INDENTS[min(dpth, 127)]
     ln = "%s(%s) {" %(func,msg)
     #if self.dlvl <= self.INF and func[0] != '_':
     #  sys.stdout.write ("{} {}\n".format(func,msg))
     if not self.log_only:
       sys.stdout.write (ws + ln + "\n")
-    if self.log_fp:
-      self.log_fp.write (self.__format_line (self.DBG, ln))
+    if self._log_on:
+      self.__log_write (self.DBG, self._fmt_line (self, self.DBG, ln, frame))
 
 
   # show func enter and leave msgs at 'dbg' level
@@ -283,71 +462,86 @@ class Dbg:
 
   # get deeper in stack so __format() works correctly for all
   def __leave(self, msg=""):
+    if self._depth > 0:
+      self._depth -= 1
+    dpth = self._depth
     if not self.trc:
       return
-    if self.__filter (3):
+    frame = sys._getframe(2)  # skip __leave and leave
+    if self.__filter (frame):
       return
-    dpth = self.__frame_depth()
-    func = inspect.currentframe().f_back.f_back.f_code.co_name
-    lnum = inspect.currentframe().f_back.f_back.f_lineno
-    ws = "  " * (dpth - 4)
+    func = frame.f_code.co_name
+    lnum = frame.f_lineno
+    ws = self._INDENTS[min(dpth, 127)]
     ln = "} # %s:%s %s" %(func,lnum,msg)
     if not self.log_only:
       sys.stdout.write (ws + ln + "\n")
-    if self.log_fp:
-      self.log_fp.write (self.__format_line (self.DBG, ln))
+    if self._log_on:
+      self.__log_write (self.DBG, self._fmt_line (self, self.DBG, ln, frame))
 
 
   # output a debug line; optionally log it, too
   def __print(self, dlvl, txt, dpth=None):
 
-    if self.__filter (3): return
+    frame = sys._getframe(2)  # skip __print and the d.<lvl>() caller
+    if self.__filter (frame): return
 
-    if self.log_fp:
-      self.log_fp.write (self.__format_line (dlvl, txt))
+    if self._log_on:
+      self.__log_write (dlvl, self._fmt_line (self, dlvl, txt, frame))
 
     #if not self.log_only or (self.force_out and dlvl <= self.OUT):
     if not self.log_only:
       #if self.dlvl >= self.DBG:
       if self.trc and not self.log_only:
-        ws_dpth = self.__frame_depth() - 3 # legacy d.<lvl>() calls
-        if dpth is not None: ws_dpth = dpth - 2
-        ws = "  " * ws_dpth
+        ws_dpth = self._depth if dpth is None else dpth
+        ws = self._INDENTS[min(ws_dpth, 127)]
       else:
         ws = ""
       sys.stdout.write (ws + txt + "\n")
 
 
-  def any(self, txt):
-    if self.dlvl >= self.ANY: self.__print (self.ANY,txt)
-  def out(self, txt):
-    if self.dlvl >= self.OUT: self.__print (self.OUT,txt)
-  def err(self, txt):
-    if self.dlvl >= self.ERR: self.__print (self.ERR,txt)
-  def wrn(self, txt):
-    if self.dlvl >= self.WRN: self.__print (self.WRN,txt)
-  def inf(self, txt):
-    if self.dlvl >= self.INF: self.__print (self.INF,txt)
-  def dbg(self, txt):
-    if self.dlvl >= self.DBG: self.__print (self.DBG,txt)
-  def db2(self, txt):
-    if self.dlvl >= self.DB2: self.__print (self.DB2,txt)
-  def log(self, txt):
-    if self.dlvl >= self.LOG: self.__print (self.LOG,txt)
+  # level methods; shadowed by _lvl_off when disabled at dlvl
+  def any(self, txt): self.__print (self.ANY,txt)
+  def out(self, txt): self.__print (self.OUT,txt)
+  def err(self, txt): self.__print (self.ERR,txt)
+  def wrn(self, txt): self.__print (self.WRN,txt)
+  def inf(self, txt): self.__print (self.INF,txt)
+  def dbg(self, txt): self.__print (self.DBG,txt)
+  def db2(self, txt): self.__print (self.DB2,txt)
+  def log(self, txt): self.__print (self.LOG,txt)
+
+  # exc() lines at disabled levels land here
+  def _noop(self, dlvl, txt): pass
+
+  # disabled d.<lvl>() names get _lvl_off in the instance dict; enabled ones
+  # fall through to the class methods; _emit is exc()'s dispatch by level,
+  # __print if enabled, else _noop, with ANY (-1) last so _emit[lvl]
+  # indexes every level directly; plain functions, called with self, so d
+  # isn't kept alive by either
+  def _recompute_enabled(self):
+    for name, lvl in self._lvl_meths:
+      if self.dlvl >= lvl:
+        self.__dict__.pop(name, None)
+      else:
+        self.__dict__[name] = _lvl_off
+    self._emit = tuple(Dbg.__print if self.dlvl >= lvl else Dbg._noop
+                       for lvl in (*range(self.OUT, self.LOG+1), self.ANY))
+
   def exc(self, x, msg, xit=False, lvl=None):
     if lvl is None:
       lvl = self.DBG
     # self.dbg (msg)
-    if self.dlvl >= lvl: self.__print (lvl,msg)
+    self._emit[lvl] (self,lvl,msg)
     msgs = x.args[0]
     if isinstance(msgs,tuple):
       for msg in msgs:
         # self.dbg (str(msg))
-        if self.dlvl >= lvl: self.__print (lvl,str(msg))
+        self._emit[lvl] (self,lvl,str(msg))
     else:
       # self.dbg (str(x))
-      if self.dlvl >= lvl: self.__print (lvl,str(x))
+      self._emit[lvl] (self,lvl,str(x))
     if xit:
+      self.flush()
       sys.exit(1)
 
 
@@ -371,20 +565,16 @@ class Dbg:
       else:
         raise x from y
     else:
+      frame = sys._getframe(1)
       etyp, eobj, etb = sys.exc_info()
       if etyp:
         fnm = os.path.split(etb.tb_frame.f_code.co_filename)[1]
         ln = etb.tb_lineno
         #print ("dmf: {} {} {}".format(etyp,fnm,ln))
       else:
-        try:
-          fnm = inspect.currentframe().f_back.f_globals['__file__']
-        except:
-          fnm = "<nofile>"
-        fnm = os.path.realpath(fnm)
-        fnm = os.path.basename(fnm)
-        ln = inspect.currentframe().f_back.f_lineno
-      func = inspect.currentframe().f_back.f_code.co_name
+        fnm = self._resolve_fnm(frame.f_code)
+        ln = frame.f_lineno
+      func = frame.f_code.co_name
       if self.dlvl >= self.INF:
         msg = msg+" [{}, {}(), ln:{}] ".format(fnm,func,ln)
       if self.dlvl >= self.DBG and nl:
@@ -408,20 +598,16 @@ class Dbg:
 
 
   def except_msg(self, msg=None, e=None):
+    frame = sys._getframe(1)
     etyp, eobj, etb = sys.exc_info()
     if etyp:
       fnm = os.path.split(etb.tb_frame.f_code.co_filename)[1]
       ln = etb.tb_lineno
       #print ("dmf: {} {} {}".format(etyp,fnm,ln))
     else:
-      try:
-        fnm = inspect.currentframe().f_back.f_globals['__file__']
-      except:
-        fnm = "<nofile>"
-        fnm = os.path.realpath(fnm)
-        fnm = os.path.basename(fnm)
-        ln = inspect.currentframe().f_back.f_lineno
-    func = inspect.currentframe().f_back.f_code.co_name
+      fnm = self._resolve_fnm(frame.f_code)
+      ln = frame.f_lineno
+    func = frame.f_code.co_name
     if not msg:
       msg = ''
     if self.dlvl >= self.INF:
@@ -460,6 +646,7 @@ class Dbg:
       q(uit)
     """
     import pdb
+    self.flush()
     print ("Python debugger\n{}",format(help_str))
     pdb.set_trace()
 
@@ -478,14 +665,12 @@ class Dbg:
 
   # set log_file
   def setLogFile(self, log_file):
-    self.log_file = log_file
-    self.log_fp = open (log_file, 'a')
+    self.__open_log (log_file)
 
 
   # set log_fp
   def setLogFp(self, log_fp):
-    if self.log_fp:
-      self.log_fp.close()
+    self.__close_log()
     self.log_fp = log_fp
 
 
@@ -509,6 +694,26 @@ class Dbg:
     self.file_n_line = file_n_line
 
 
+  # set fnm filter
+  def setFnm(self, fnm):
+    self.fnm = fnm
+
+
+  # set func filter; comma delimited list
+  def setFunc(self, func):
+    self.func = func
+
+
+  # set ln_beg filter
+  def setLnBeg(self, ln_beg):
+    self.ln_beg = ln_beg
+
+
+  # set ln_end filter
+  def setLnEnd(self, ln_end):
+    self.ln_end = ln_end
+
+
   # set hdr_date_format
   def setHdrDateFormat(self, hdr_date_format):
     self.hdr_date_format = hdr_date_format
@@ -516,7 +721,7 @@ class Dbg:
 
   # get debug level
   def getLvl(self):
-    return list(self.levels.keys())[list(self.levels.values()).index(self.dlvl)]
+    return self._lvl_name[self.dlvl]
 
 
   # get debug trace
@@ -582,11 +787,10 @@ class Dbg:
     # level
     parser.add_argument (
       "-dlvl", "--dbg_level", metavar="level",
-      default=list(Dbg.levels.keys())[list(Dbg.levels.values()).index(Dbg.dlvl)],
+      default=Dbg._lvl_name[Dbg.dlvl],
       choices=Dbg.levels,
       help="Enable debug output at specified level. " +
-      "Allowed values are: [" + 
-      ", ".join(sorted(Dbg.levels, key=Dbg.levels.get)) + "].")
+      "Allowed values are: " + Dbg._lvl_help + ".")
 
     # trace
     parser.add_argument (
@@ -660,6 +864,9 @@ class Dbg:
     # handy to have around
     self.script = os.path.basename(sys.argv[0])
 
+    # pending log lines; see __log_write()
+    self._log_buf = []
+
     # set debug level
     try:
       self.dlvl = self.levels[lvl]
@@ -671,8 +878,7 @@ class Dbg:
 
     # open log_file; gets closed in __exit__()
     if log_file != None:
-      self.log_file = log_file
-      self.log_fp = open (log_file, 'a')
+      self.__open_log (log_file)
 
     if log_only != None:
       self.log_only = log_only
@@ -690,7 +896,7 @@ class Dbg:
       raise ValueError("Can't specify log_only and no log_file!")
 
     if hdr_date_format != None:
-      self.hdr_date_format = hdr_date_format
+      self.setHdrDateFormat(hdr_date_format)
 
     if file_func_line != None:
       self.file_func_line = file_func_line
@@ -707,13 +913,26 @@ class Dbg:
     if line_end != None:
       self.ln_end = line_end
 
+    # level methods, filter predicate for __filter(), log line formatter,
+    # and timestamp format; for when the defaults weren't overridden
+    # above, or were set on the class
+    self._recompute_enabled()
+    self._set_filter()
+    self._set_fmt_line()
+    self._set_ts_fmt()
+
   def __enter__(self):
     return self
 
 
   def __exit__(self, exc_type, exc_value, traceback):
-    if self.log_fp != None:
-      self.log_fp.close()
+    self.__close_log()
+
+
+  # don't drop buffered log lines, or leak the log, if __exit__() was never
+  # called
+  def __del__(self):
+    self.__close_log(close_fp=False)
 
 
 # test driver